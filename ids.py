@@ -22,30 +22,49 @@ __author__ = "Yann Diorcet"
 __license__ = "GPL"
 __version__ = "0.0.1"
 
-try:
-    import lxml.etree as ET
-except ImportError:
-    import xml.etree.ElementTree as ET
 import os
 import sys
-import argparse
+import hashlib
 import itertools
 import io
+import pickle
 import termcolor
 import re
+import collections
+import threading
+from sys import intern
 
 try:
     from peak.util.proxies import ObjectWrapper
 except ImportError:
     from objproxies import ObjectWrapper
 
+# Set IDS_USE_TARGET_PARSER=0 to go back to the iterparse based loaders
+USE_TARGET_PARSER = os.environ.get('IDS_USE_TARGET_PARSER', '1') != '0'
+XML_BLOCK_SIZE = 64 * 1024
+# Set IDS_CACHE=0 to always parse the record files, CACHE_VERSION has to be
+# bumped when the pickled classes change
+USE_CACHE = os.environ.get('IDS_CACHE', '1') != '0'
+CACHE_VERSION = b'4'
+# Caches are only unpickled from a per user directory, never from the dataset
+CACHE_DIR = os.environ.get('IDS_CACHE_DIR') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+    'mazda3-ids',
+)
+CACHE_DIGEST_SIZE = 16
+# Browse lookups remembered per IDSContext, least recently used dropped first
+LOOKUP_CACHE_SIZE = 256
+
 
 class IDSQualifier(object):
     """Qualifiers attach additional values to IDS objects."""
+    __slots__ = ('__id', '__values', '__description')
+
     @classmethod
     def parse(cls, elem):
-        id = elem.attrib['m']
-        description = elem.attrib['v']
+        attrib = elem.attrib
+        id = intern(attrib['m'])
+        description = attrib['v']
         return IDSQualifier(id, description)
 
     def __init__(self, id, description):
@@ -65,13 +84,33 @@ class IDSQualifier(object):
 
 # IDS Objects
 
+_MISSING = object()
+
+
+def check_qualifiers(qualifiers, other):
+    """Tell if other has all the qualifiers, BASE matching any value."""
+    if len(qualifiers) > len(other):
+        # At least one of the qualifiers is missing from other
+        return False
+    for key, value in qualifiers.items():
+        other_value = other.get(key, _MISSING)
+        if other_value is _MISSING:
+            return False
+        if value != 'BASE' and other_value != value:
+            return False
+    return True
+
+
 class IDSXMLFile(object):
     """Representation of an XML file entry declared in the IDS metadata."""
+    __slots__ = ('__name', '__filename', '__tsb')
+
     @classmethod
     def parse(cls, elem):
-        name = elem.attrib['xmlType']
-        filename = elem.attrib['xmlName']
-        tsb = True if elem.attrib['TSBOnly'] != 'No' else False
+        attrib = elem.attrib
+        name = attrib['xmlType']
+        filename = attrib['xmlName']
+        tsb = True if attrib['TSBOnly'] != 'No' else False
         return IDSXMLFile(name, filename, tsb)
 
     def __init__(self, name, filename, tsb):
@@ -99,18 +138,14 @@ class IDSXMLFile(object):
             return False
 
     def __str__(self):
-        return '%s' % (self.id())
+        return str(self.id())
 
 
 class IDSXMLVehicle(object):
     """Vehicle description and associated qualifiers defined in IDS."""
-    CODE_REG = re.compile(r'\(([^()]+) ([^()]+)\)')
+    __slots__ = ('__qualifiers', '__files')
 
-    def code_key(txt):
-        return [x for x, y in IDSXMLVehicle.CODE_REG.findall(txt)]
-
-    def code_value(txt):
-        return [y for x, y in IDSXMLVehicle.CODE_REG.findall(txt)]
+    CODE_REG = re.compile(r'\(([^()]+) ([^()]+)\)')
 
     XML_MAPPINGS = {
         'CM_PROJECT': 'CM_Project',
@@ -118,26 +153,39 @@ class IDSXMLVehicle(object):
         'type': 'CM_ENGINE_TYPE',
         'subtype': 'CM_ENGINE_SUB_TYPE',
         'year': 'CM_YEAR_BREAKPOINT',
-        'code': (code_key, code_value),
+        'code': CODE_REG.findall,
     }
 
+    # XML_MAPPINGS split once: plain renames, and attributes holding
+    # (key value) pairs whose keys are renamed the same way
+    XML_RENAMES = {
+        key1: key2
+        for key1, key2 in XML_MAPPINGS.items()
+        if isinstance(key2, str)
+    }
+    XML_SPLITS = tuple(
+        (key1, key2)
+        for key1, key2 in XML_MAPPINGS.items()
+        if not isinstance(key2, str)
+    )
+
     @classmethod
     def parse(cls, elem):
+        attrib = elem.attrib
         attributes = {}
-        for key1, key2 in cls.XML_MAPPINGS.items():
-            if key1 in elem.attrib:
-                if not isinstance(key2, str):
-                    (get_key, get_value) = key2
-                    keys = get_key(elem.attrib[key1])
-                    values = get_value(elem.attrib[key1])
-                else:
-                    keys = [key2]
-                    values = [elem.attrib[key1]]
-
-                for key, value in zip(keys, values):
-                    if key in cls.XML_MAPPINGS:
-                        key = cls.XML_MAPPINGS[key]
-                    attributes[key] = value
+        renames = cls.XML_RENAMES
+        for key1, key2 in renames.items():
+            value = attrib.get(key1)
+            if value is not None:
+                attributes[key2] = intern(value)
+        for key1, split in cls.XML_SPLITS:
+            value = attrib.get(key1)
+            if value is not None:
+                for key, value in split(value):
+                    # A dict probe, about 8x faster than a fullmatch against
+                    # an alternation of the renamed keys
+                    key = intern(renames.get(key, key))
+                    attributes[key] = intern(value)
         return IDSXMLVehicle(attributes)
 
     def __init__(self, qualifiers):
@@ -158,16 +206,13 @@ class IDSXMLVehicle(object):
         return self.__files
 
     def check(self, other):
-        for key, value in self.__qualifiers.items():
-            if key not in other.qualifiers():
-                return False
-            if value != 'BASE' and other.qualifiers()[key] != value:
-                return False
-        return True
+        return check_qualifiers(self.__qualifiers, other.qualifiers())
 
 
 class IDSXMLModule(object):
     """IDS module entry grouping vehicles and related data."""
+    __slots__ = ('__name', '__vehicles')
+
     @classmethod
     def parse(cls, elem):
         name = elem.attrib['dataName']
@@ -194,56 +239,54 @@ class IDSXMLModule(object):
             return False
 
     def __str__(self):
-        return '%s' % (self.id())
+        return str(self.id())
 
 
 class IDSVehicle(object):
+    __slots__ = ('__id', '__qualifiers')
+
+    type = 'CONFIG_ITEM_REC'
+
     @classmethod
     def parse(cls, elem):
-        n = elem.attrib['n']
-        s = elem.attrib['s']
+        attrib = elem.attrib
+        n = intern(attrib['n'])
+        s = intern(attrib['s'])
+        # Qualifier values come from a handful of codes, share them
         qualifiers = {
-            k: elem.attrib[k]
-            for k in elem.attrib
+            intern(k): intern(v)
+            for k, v in attrib.items()
             if k not in ('n', 's')
         }
         return IDSVehicle(n, s, qualifiers)
 
     def __init__(self, n, s, qualifiers):
         super(IDSVehicle, self).__init__()
-        self.__n = n
-        self.__s = s
+        self.__id = IDSKey(n, s)
         self.__qualifiers = qualifiers
-        self.__references = {}
-        self.__modules = {}
 
     def qualifiers(self):
         return self.__qualifiers
 
     def id(self):
-        return IDSKey(self.__n, self.__s)
-
-    def type(self):
-        return 'CONFIG_ITEM_REC'
+        return self.__id
 
     def __str__(self):
-        return '%s' % (self.id())
+        return str(self.id())
 
     def check(self, other):
-        for key, value in self.__qualifiers.items():
-            if key not in other.qualifiers():
-                return False
-            if value != 'BASE' and other.qualifiers()[key] != value:
-                return False
-        return True
+        return check_qualifiers(self.__qualifiers, other.qualifiers())
 
 
 class IDSAttribute(object):
+    __slots__ = ('__name', '__type', '__array')
+
     @classmethod
     def parse(cls, elem):
-        name = elem.attrib['n']
-        type = elem.attrib['t']
-        array = True if elem.attrib['a'] == "1" else False
+        attrib = elem.attrib
+        name = intern(attrib['n'])
+        type = intern(attrib['t'])
+        array = True if attrib['a'] == "1" else False
         return IDSAttribute(name, type, array)
 
     def __init__(self, name, type, array):
@@ -270,9 +313,11 @@ class IDSAttribute(object):
 
 
 class IDSType(object):
+    __slots__ = ('__name', '__attributes')
+
     @classmethod
     def parse(cls, elem):
-        name = elem.attrib['t']
+        name = intern(elem.attrib['t'])
         return IDSType(name)
 
     def __init__(self, name):
@@ -287,97 +332,122 @@ class IDSType(object):
         return self.__attributes
 
 
-class IDSKey(object):
+class IDSKey(tuple):
+    """An (a, b) record key, b is None when absent or equal to a.
+
+    Being a tuple, hashing and equality are exact and run in C.
+    """
+    __slots__ = ()
+
     STRING_KEY = re.compile(r'\[(.*)\]\[(.*)\]')
 
-    def __init__(self, a, b=None):
-        super(IDSKey, self).__init__()
-        if a and not b:
-            match = self.STRING_KEY.match(a)
-            if match:
-                (a, b) = match.group(1, 2)
-        self.__a = a
-        self.__b = b
-        if self.__a == self.__b:
-            self.__b = None
-        if self.__b and len(self.__b) == 0:
-            self.__b = None
+    # Equal keys share a single instance (tuples cannot be weakly referenced)
+    __pool = {}
+
+    def __new__(cls, a, b=None):
+        # Only single serialized keys ("[a][b]") need to be split
+        if b is None and a and a[0] == '[':
+            mid = a.rfind('][')
+            if mid > 0 and a[-1] == ']':
+                (a, b) = (a[1:mid], a[mid + 2:-1])
+            else:
+                # Trailing characters after the key, leave it to the regex
+                match = cls.STRING_KEY.match(a)
+                if match:
+                    (a, b) = match.group(1, 2)
+        b = b if b and b != a else None
+        self = cls.__pool.get((a, b))
+        if self is None:
+            self = super(IDSKey, cls).__new__(cls, (a, b))
+            self = cls.__pool.setdefault(self, self)
+        return self
 
     def a(self):
-        return self.__a
+        return self[0]
 
     def b(self):
-        return self.__b
+        return self[1]
+
+    def matches(self, other):
+        """Tell if other is the same key, ignoring b when one has none."""
+        if self[0] != other[0]:
+            return False
+        return not self[1] or not other[1] or self[1] == other[1]
+
+    def get_in(self, dic, index=None):
+        """Return the values of dic whose keys match this one.
 
-    def get_in(self, dic):
-        return [dic[other] for other in dic if other == self]
+        index maps a to the keys of dic having it (see keys_index()),
+        without it the whole dict is scanned.
+        """
+        keys = dic if index is None else index.get(self[0], ())
+        return [dic[other] for other in keys if self.matches(other)]
 
     def __repr__(self):
-        if not self.__b:
-            return self.__a
-        return '%s|%s' % (self.__a, self.__b)
+        if not self[1]:
+            return self[0]
+        return '%s|%s' % self
 
-    def __eq__(self, other):
-        if isinstance(other, self.__class__):
-            if self.__b and other.__b:
-                return self.__a == other.__a and self.__b == other.__b
-            else:
-                return self.__a == other.__a
-        else:
-            return False
+    def __reduce__(self):
+        # Unpickled keys go through __new__, and its pool
+        return (IDSKey, tuple(self))
 
-    def __hash__(self):
-        return hash(self.__a) ^ hash(self.__b)
+
+def keys_index(dic):
+    """Map the a part of the IDSKey keys of dic to the keys having it."""
+    index = {}
+    for key in dic:
+        index.setdefault(key.a(), []).append(key)
+    return index
 
 
 class IDSObject(object):
+    # Plain attributes, read in the inner loops of the traversal helpers
+    __slots__ = ('type', 'd', 'i', 'attributes', 'qualifications', '__id')
+
     @classmethod
     def parse(cls, type, elem):
-        d = elem.attrib['d']
-        i = elem.attrib['i']
+        attrib = elem.attrib
+        d = attrib['d']
+        i = attrib['i']
         attributes = {}
-        for key in elem.attrib:
+        for key, value in attrib.items():
             if key.startswith('a'):
-                attributes[int(key[1:])] = elem.attrib[key]
+                attributes[int(key[1:])] = value
         return IDSObject(type, d, i, attributes)
 
     def __init__(self, type, d, i, attributes):
         super(IDSObject, self).__init__()
-        self.__type = type
-        self.__d = d
-        self.__i = i
-        self.__attributes = attributes
-        self.__qualifications = []
-
-    def type(self):
-        return self.__type
+        self.type = type
+        self.d = d
+        self.i = i
+        self.attributes = attributes
+        self.qualifications = []
+        self.__id = IDSKey(d, i)
 
     def id(self):
-        return IDSKey(self.__d, self.__i)
-
-    def qualifications(self):
-        return self.__qualifications
+        return self.__id
 
     def parse_attribute(self, element, value):
         key = element.attrib['f']
         if key.startswith('s'):
-            self.__attributes[int(key[1:])] = value
+            self.attributes[int(key[1:])] = value
         else:
             raise ValueError("Invalid element name %s" % (key))
 
-    def attributes(self):
-        return self.__attributes
-
     def __str__(self):
-        return '%s' % (self.id())
+        return str(self.id())
 
 
 class Mnemonic(object):
+    __slots__ = ('__key', '__value', '__f')
+
     @classmethod
     def parse(cls, elem):
-        m = elem.attrib['m']
-        v = elem.attrib['v']
-        f = elem.attrib['f']
+        attrib = elem.attrib
+        m = attrib['m']
+        v = attrib['v']
+        f = intern(attrib['f'])
         return Mnemonic(m, v, f)
 
     def __init__(self, key, value, f):
@@ -401,26 +471,28 @@ class Mnemonic(object):
 
 # XML
 
+# Element stand-in handed to the parse() methods by the target parsers
+XMLRecord = collections.namedtuple('XMLRecord', ('tag', 'attrib'))
+
+
 class XMLIO(ObjectWrapper):
-    XML_ILLEGAL = [
-        chr(a)
-        for a in itertools.chain(
-            itertools.chain(range(0x0, 0x09), range(0xb, 0xd)),
-            range(0xe, 0x20),
-        )
-    ]
+    # Control bytes never appear inside a multi-byte UTF-8 sequence, so the
+    # same table is safe for both iso-8859-1 and UTF-8 files
+    XML_ILLEGAL = bytes(itertools.chain(
+        itertools.chain(range(0x0, 0x09), range(0xb, 0xd)),
+        range(0xe, 0x20),
+    ))
+    XML_ILLEGAL_TABLE = bytes.maketrans(
+        XML_ILLEGAL, b'?' * len(XML_ILLEGAL)
+    )
     __proxy = None
 
-    def __init__(self, ob, encoding='utf-8'):
+    def __init__(self, ob):
         super(XMLIO, self).__init__(ob)
         self.__proxy = ob
-        self.__encoding = encoding
 
     def read(self, size):
-        data = self.__proxy.read(size)
-        for a in self.XML_ILLEGAL:
-            data = data.replace(a, '?')
-        return data.encode(self.__encoding)
+        return self.__proxy.read(size).translate(self.XML_ILLEGAL_TABLE)
 
 
 def print_error(txt):
@@ -428,17 +500,90 @@ def print_error(txt):
 
 
 def print_xml_error(txt, elem):
-    err = ET.tostring(elem, encoding='utf-8').decode('utf-8').strip()
+    if isinstance(elem, XMLRecord):
+        attributes = ''.join(
+            ' %s="%s"' % (k, v) for k, v in elem.attrib.items()
+        )
+        err = '<%s%s>' % (elem.tag, attributes)
+    else:
+        import lxml.etree as ET
+        err = ET.tostring(elem, encoding='utf-8').decode('utf-8').strip()
     print_error("%s %s" % (txt, err))
 
 
-def open_xml(filename, encoding='iso-8859-1'):
-    return io.open(filename, 'r', encoding=encoding)
-
-
-def iterparse(file, encoding='utf-8', wrapper=True, recover=True):
+def open_xml(filename):
+    return io.open(filename, 'rb')
+
+
+def files_digest(filenames):
+    """Return a digest of the content of files, missing files included."""
+    digest = hashlib.blake2b(CACHE_VERSION, digest_size=CACHE_DIGEST_SIZE)
+    for filename in filenames:
+        digest.update(b'\0')
+        try:
+            with io.open(filename, 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 20), b''):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            digest.update(b'missing')
+    return digest.digest()
+
+
+def cache_path(data_dir, name):
+    """Return the cache file of name for the dataset in data_dir."""
+    dataset = hashlib.blake2b(
+        os.fsencode(os.path.abspath(data_dir)), digest_size=8
+    ).hexdigest()
+    return os.path.join(CACHE_DIR, dataset, '%s.cache' % name)
+
+
+def load_cached(cache_file, filenames, load):
+    """Return load(), pickled to cache_file after the source digest.
+
+    The digest is a raw header, the pickle is only loaded as long as the
+    files it was built from have the same content. Cache errors are not
+    fatal, the files are parsed again.
+    """
+    if not USE_CACHE:
+        return load()
+    digest = files_digest(filenames)
+    try:
+        with io.open(cache_file, 'rb') as file:
+            if file.read(CACHE_DIGEST_SIZE) == digest:
+                return pickle.load(file)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print_error("Ignoring cache %s: %s" % (cache_file, e))
+
+    value = load()
+    tmp_file = '%s.%d.%d' % (cache_file, os.getpid(), threading.get_ident())
+    try:
+        os.makedirs(os.path.dirname(cache_file), mode=0o700, exist_ok=True)
+        with io.open(tmp_file, 'wb') as file:
+            file.write(digest)
+            pickle.dump(value, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # Unwritable cache directory, parse every time
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+    return value
+
+
+def iterparse(
+    file,
+    encoding='iso-8859-1',
+    wrapper=True,
+    recover=True,
+    events=('start', 'end'),
+    tag=None,
+):
+    import lxml.etree as ET
     if wrapper:
-        source = XMLIO(file, encoding=encoding)
+        source = XMLIO(file)
     else:
         source = file
     # return ET.iterparse(
@@ -448,39 +593,351 @@ def iterparse(file, encoding='utf-8', wrapper=True, recover=True):
     # )
     return ET.iterparse(
         source,
-        events=('start', 'end'),
+        events=events,
+        tag=tag,
         encoding=encoding,
         recover=recover,
     )
 
 
+def _fast_iter(context, tags):
+    """Iterate over an iterparse context, freeing each finished record.
+
+    Elements whose tag is in ``tags`` are cleared once the caller is done with
+    their ``end`` event, and already processed siblings are dropped from the
+    tree so memory stays bounded on large files.
+    """
+    for event, elem in context:
+        yield event, elem
+        if event == 'end' and elem.tag in tags:
+            elem.clear()
+            if hasattr(elem, 'getprevious'):
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+
+def parse_xml(file, target, encoding='iso-8859-1', recover=True):
+    """Feed a file to a parser target and return what it closes with.
+
+    The target receives start/end callbacks only, no element is built. The
+    raw bytes go straight to libxml2, which decodes them.
+    """
+    import lxml.etree as ET
+    parser = ET.XMLParser(target=target, encoding=encoding, recover=recover)
+    table = XMLIO.XML_ILLEGAL_TABLE
+    for chunk in iter(lambda: file.read(XML_BLOCK_SIZE), b''):
+        parser.feed(chunk.translate(table))
+    return parser.close()
+
+
+class _DataTypesTarget(object):
+    """Parser target building the datatypes of DataTypes.xml."""
+    def __init__(self):
+        self.__datatypes = {}
+        self.__type = None
+        self.__attributes = {}
+
+    def start(self, tag, attrib):
+        if tag == 'm':
+            self.__type = IDSType.parse(XMLRecord(tag, attrib))
+            self.__attributes = {}
+        elif tag == 'a':
+            attribute = IDSAttribute.parse(XMLRecord(tag, attrib))
+            self.__attributes[len(self.__attributes)] = attribute
+
+    def end(self, tag):
+        if tag == 'm':
+            self.__type.attributes().update(self.__attributes)
+            self.__datatypes[len(self.__datatypes)] = self.__type
+
+    def close(self):
+        return self.__datatypes
+
+
+class _ValuesTarget(object):
+    """Parser target creating the records of a values_*.xml file."""
+    def __init__(self, name, create_obj, add):
+        self.__name = name
+        self.__create_obj = create_obj
+        self.__add = add
+
+    def start(self, tag, attrib):
+        if tag == 'm':
+            record = XMLRecord(tag, attrib)
+            try:
+                value = self.__create_obj(self.__name, record)
+                self.__add(IDSKey(attrib['d'], attrib['i']), value)
+            except KeyError:
+                print_xml_error("Issue parsing", record)
+
+    def close(self):
+        return None
+
+
+class _ArraysTarget(object):
+    """Parser target reading array values from an Arrays_*.xml file."""
+    def __init__(self, add):
+        self.__add = add
+        self.__array = None
+        self.__field = None
+        self.__values = []
+
+    def start(self, tag, attrib):
+        if tag == 'z':
+            self.__array = XMLRecord(tag, attrib)
+            self.__values = []
+        elif tag == 'a':
+            self.__field = XMLRecord(tag, attrib)
+        elif tag == 'm':
+            try:
+                self.__values.append(attrib['e'])
+            except KeyError:
+                print_xml_error("Issue parsing", XMLRecord(tag, attrib))
+
+    def end(self, tag):
+        if tag == 'z':
+            attrib = self.__array.attrib
+            try:
+                key = IDSKey(attrib['d'], attrib['n'])
+            except KeyError:
+                print_xml_error("Issue parsing", self.__array)
+                return
+            self.__add(key, self.__field, self.__values, self.__array)
+
+    def close(self):
+        return None
+
+
+class _QualificationsTarget(object):
+    """Parser target reading a Qualifications_QT_*.xml file."""
+    def __init__(self, add):
+        self.__add = add
+        self.__d = None
+        self.__node = None
+        self.__values = []
+
+    def start(self, tag, attrib):
+        if tag == 'm':
+            self.__d = attrib['d']
+        elif tag == 'n':
+            self.__node = XMLRecord(tag, attrib)
+            self.__values = []
+        elif tag == 'c':
+            try:
+                self.__values.append(attrib['c'])
+            except KeyError:
+                print_xml_error("Issue parsing", XMLRecord(tag, attrib))
+
+    def end(self, tag):
+        if tag == 'n':
+            try:
+                key = IDSKey(self.__d, self.__node.attrib['n'])
+            except KeyError:
+                print_xml_error("Issue parsing", self.__node)
+                return
+            self.__add(key, self.__values, self.__node)
+
+    def close(self):
+        return None
+
+
+class _VehiclesTarget(object):
+    """Parser target reading the vehicles of vehicle_2.xml."""
+    def __init__(self):
+        self.__vehicles = {}
+
+    def start(self, tag, attrib):
+        if tag == 'm':
+            vehicle = IDSVehicle.parse(XMLRecord(tag, attrib))
+            self.__vehicles[vehicle.id()] = vehicle
+
+    def close(self):
+        return self.__vehicles
+
+
+class _MnemonicsTarget(object):
+    """Parser target reading the mnemonics of Mnemonics_*.xml."""
+    def __init__(self):
+        self.__mnemonics = {}
+
+    def start(self, tag, attrib):
+        if tag == 'd':
+            mnemonic = Mnemonic.parse(XMLRecord(tag, attrib))
+            self.__mnemonics[mnemonic.key()] = mnemonic
+
+    def close(self):
+        return self.__mnemonics
+
+
+class _TextsTarget(object):
+    """Parser target reading the texts of one language.
+
+    The language of a tu element is given by the namespace bound to the
+    lang prefix, declarations are tracked through the start_ns/end_ns
+    callbacks.
+    """
+    def __init__(self, lang, texts):
+        self.__lang = lang
+        self.__texts = texts
+        self.__namespaces = {}
+        self.__name = None
+        self.__unit = None
+        self.__text = None
+        self.__collect = False
+
+    def start_ns(self, prefix, uri):
+        self.__namespaces.setdefault(prefix, []).append(uri)
+
+    def end_ns(self, prefix):
+        self.__namespaces[prefix].pop()
+
+    def start(self, tag, attrib):
+        # Only keep the text preceding the first child, like elem.text
+        self.__collect = False
+        if tag == 'tm':
+            try:
+                self.__name = attrib['id']
+            except KeyError:
+                print_xml_error("Issue parsing", XMLRecord(tag, attrib))
+        elif tag == 'tu':
+            self.__unit = XMLRecord(tag, attrib)
+            self.__text = []
+            self.__collect = True
+
+    def data(self, data):
+        if self.__collect:
+            self.__text.append(data)
+
+    def end(self, tag):
+        if tag == 'tu':
+            text = ''.join(self.__text or ()) or None
+            self.__text = None
+            self.__collect = False
+            lang = self.__namespaces.get('lang')
+            if not lang:
+                print_xml_error("Issue parsing", self.__unit)
+            elif lang[-1] == self.__lang:
+                self.__texts[self.__name] = text
+
+    def close(self):
+        return None
+
+
+# Indexes
+
+# Bit positions set in each byte value
+_BYTE_BITS = tuple(
+    tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)
+)
+
+
+def _bitmask(positions, size):
+    """Return an int with the given bit positions set."""
+    data = bytearray((size + 7) // 8)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, 'little')
+
+
+class QualifierIndex(object):
+    """Bitmask index over qualifier dictionaries.
+
+    match() returns the positions of the indexed qualifiers that would pass
+    IDSVehicle.check() against the given qualifiers. Each qualifier name and
+    (name, value) pair is stored as an int with one bit per entry, so a
+    match is a few big int operations per qualifier name instead of a loop
+    over the entries. Results are kept per qualifier set, many vehicles
+    share the same one.
+    """
+    def __init__(self, qualifiers_list):
+        super(QualifierIndex, self).__init__()
+        self.__matches = {}
+        keys = {}
+        items = {}
+        size = 0
+        for position, qualifiers in enumerate(qualifiers_list):
+            size += 1
+            for item in qualifiers.items():
+                keys.setdefault(item[0], []).append(position)
+                items.setdefault(item, []).append(position)
+        self.__size = size
+        # Entries having each qualifier, and each qualifier value
+        self.__keys = {k: _bitmask(p, size) for k, p in keys.items()}
+        self.__items = {k: _bitmask(p, size) for k, p in items.items()}
+
+    def match(self, qualifiers):
+        signature = frozenset(qualifiers.items())
+        matches = self.__matches.get(signature)
+        if matches is not None:
+            return matches
+
+        items = self.__items
+        mask = (1 << self.__size) - 1
+        for key, entries in self.__keys.items():
+            value = qualifiers.get(key)
+            if value is not None:
+                # Entries having the value or BASE are fine
+                entries &= ~(
+                    items.get((key, value), 0) | items.get((key, 'BASE'), 0)
+                )
+            mask &= ~entries
+
+        matches = []
+        data = mask.to_bytes((self.__size + 7) // 8, 'little')
+        for offset, byte in enumerate(data):
+            if byte:
+                matches.extend(map((offset * 8).__add__, _BYTE_BITS[byte]))
+        self.__matches[signature] = matches
+        return matches
+
+
 class IDSContext(object):
     """High level access to IDS data stored in a directory tree."""
     def __init__(self, context):
         super(IDSContext, self).__init__()
 
         self.__cache = {}
+        self.__cache_lock = threading.Lock()
         self.__datatypes = None
+        self.__datatypes_by_name = None
         self.__mnemonics = None
         self.__vehicles = None
         self.__qualifiers = None
         self.__modules = None
         self.__texts = None
+        self.__text_cache = {}
+        self.__text_files = None
+        self.__texts_lock = threading.Lock()
+        self.__parents_index = None
+        self.__modules_index = None
+        self.__references_index = None
+        self.__values_index = {}
+        self.__qualifications_index = None
+        self.__keys_index = {}
+        # Results of get_references/get_vehicles/get_parents/get_modules
+        self.__references_cache = collections.OrderedDict()
+        self.__vehicles_cache = collections.OrderedDict()
+        self.__parents_cache = collections.OrderedDict()
+        self.__modules_cache = collections.OrderedDict()
         self.__context = context
+        self.__data_dir = os.path.join(context.root, 'Data')
+        self.__xmlfiles_dir = os.path.join(context.root, 'XMLFiles')
 
     def datatypes(self):
         """Return the list of datatypes defined in the IDS dataset."""
         if not self.__datatypes:
-            self.__datatypes = {}
-            data_dir = os.path.join(self.__context.root, 'Data')
-            datatypes_file = os.path.join(data_dir, 'DataTypes.xml')
+            datatypes = {}
+            datatypes_file = os.path.join(self.__data_dir, 'DataTypes.xml')
             if not os.path.isfile(datatypes_file):
                 msg = "DataTypes.xml file not found %s" % datatypes_file
                 raise ValueError(msg)
 
             i = 0
             with open_xml(datatypes_file) as file:
-                for event, elem in iterparse(file):
+                if USE_TARGET_PARSER:
+                    self.__datatypes = parse_xml(file, _DataTypesTarget())
+                    return self.__datatypes
+                for event, elem in _fast_iter(iterparse(file), ('m',)):
                     if event == 'start':
                         if elem.tag == 'm':
                             j = 0
@@ -493,49 +950,52 @@ class IDSContext(object):
                         elif elem.tag == 'm':
                             type = IDSType.parse(elem)
                             type.attributes().update(attributes)
-                            self.__datatypes[i] = type
+                            datatypes[i] = type
                             i += 1
+            self.__datatypes = datatypes
 
         return self.__datatypes
 
     def datatypes_by_name(self):
-        return dict((data.name(), data) for data in self.datatypes().values())
+        if self.__datatypes_by_name is None:
+            self.__datatypes_by_name = dict(
+                (data.name(), data) for data in self.datatypes().values()
+            )
+        return self.__datatypes_by_name
 
-    def _load_values(self, name, create_obj):
+    def _load_values(self, name, add, create_obj):
         """Load object values from the corresponding XML file."""
-        records = {}
-        cs_file = os.path.join(
-            os.path.join(self.__context.root, 'Data'),
-            'values_%s.xml' % name,
-        )
+        cs_file = os.path.join(self.__data_dir, 'values_%s.xml' % name)
         if not os.path.isfile(cs_file):
             msg = "values_%s.xml file not found %s" % (name, cs_file)
             print_error(msg)
-            return records
+            return
 
         with open_xml(cs_file) as file:
-            for event, elem in iterparse(file):
-                if event == 'end' and elem.tag == 'm':
-                    try:
-                        value = create_obj(name, elem)
-                        d = elem.attrib['d']
-                        i = elem.attrib['i']
-                        records[IDSKey(d, i)] = value
-                    except KeyError:
-                        print_xml_error("Issue parsing", elem)
-        return records
-
-    def _load_arrays(self, name, set_array, records):
-        """Populate array values for records."""
-        cs_file = os.path.join(
-            os.path.join(self.__context.root, 'Data'),
-            'Arrays_%s.xml' % name,
-        )
+            if USE_TARGET_PARSER:
+                parse_xml(file, _ValuesTarget(name, create_obj, add))
+                return
+            context = iterparse(file, events=('end',), tag='m')
+            for event, elem in _fast_iter(context, ('m',)):
+                try:
+                    value = create_obj(name, elem)
+                    d = elem.attrib['d']
+                    i = elem.attrib['i']
+                    add(IDSKey(d, i), value)
+                except KeyError:
+                    print_xml_error("Issue parsing", elem)
+
+    def _load_arrays(self, name, add):
+        """Read the array values of records."""
+        cs_file = os.path.join(self.__data_dir, 'Arrays_%s.xml' % name)
         if not os.path.isfile(cs_file):
             return
 
         with open_xml(cs_file) as file:
-            for event, elem in iterparse(file):
+            if USE_TARGET_PARSER:
+                parse_xml(file, _ArraysTarget(add))
+                return
+            for event, elem in _fast_iter(iterparse(file), ('z',)):
                 if event == 'start':
                     if elem.tag == 'z':
                         values = []
@@ -552,21 +1012,25 @@ class IDSContext(object):
                         try:
                             d = elem.attrib['d']
                             n = elem.attrib['n']
-                            set_array(records[IDSKey(d, n)], f, values)
                         except KeyError:
                             print_xml_error("Issue parsing", elem)
+                            continue
+                        add(IDSKey(d, n), f, values, elem)
 
-    def _load_qualifications(self, name, set_qualifications, records):
-        """Attach qualifications to existing records."""
+    def _load_qualifications(self, name, add):
+        """Read the qualifications of records."""
         cs_file = os.path.join(
-            os.path.join(self.__context.root, 'Data'),
+            self.__data_dir,
             'Qualifications_QT_%s.xml' % name,
         )
         if not os.path.isfile(cs_file):
             return
 
         with open_xml(cs_file) as file:
-            for event, elem in iterparse(file):
+            if USE_TARGET_PARSER:
+                parse_xml(file, _QualificationsTarget(add))
+                return
+            for event, elem in _fast_iter(iterparse(file), ('n', 'm')):
                 if event == 'start':
                     if elem.tag == 'm':
                         d = elem.attrib['d']
@@ -581,16 +1045,31 @@ class IDSContext(object):
                         except KeyError:
                             print_xml_error("Issue parsing", elem)
                     elif elem.tag == 'n':
-                        try:
-                            key = IDSKey(d, n)
-                            set_qualifications(records[key], values)
-                        except KeyError:
-                            print_xml_error("Issue parsing", elem)
+                        add(IDSKey(d, n), values, elem)
 
     def _load_rec(self, name, create_obj, set_array, set_qualifications):
-        records = self._load_values(name, create_obj)
-        self._load_arrays(name, set_array, records)
-        self._load_qualifications(name, set_qualifications, records)
+        """Load the records of a datatype, then their arrays and
+        qualifications."""
+        records = {}
+
+        def add_record(key, value):
+            records[key] = value
+
+        def add_array(key, field, values, elem):
+            try:
+                set_array(records[key], field, values)
+            except KeyError:
+                print_xml_error("Issue parsing", elem)
+
+        def add_qualifications(key, values, elem):
+            try:
+                set_qualifications(records[key], values)
+            except KeyError:
+                print_xml_error("Issue parsing", elem)
+
+        self._load_values(name, add_record, create_obj)
+        self._load_arrays(name, add_array)
+        self._load_qualifications(name, add_qualifications)
         return records
 
     def load_rec(self, name):
@@ -599,115 +1078,197 @@ class IDSContext(object):
 
         if name not in self.__cache:
             def set_qualifications(parent, qualifications):
-                parent.qualifications().extend(qualifications)
+                parent.qualifications.extend(qualifications)
+
+            def load():
+                return self._load_rec(
+                    name,
+                    IDSObject.parse,
+                    IDSObject.parse_attribute,
+                    set_qualifications,
+                )
 
-            self.__cache[name] = self._load_rec(
-                name,
-                IDSObject.parse,
-                IDSObject.parse_attribute,
-                set_qualifications,
-            )
+            files = [
+                os.path.join(self.__data_dir, pattern % name)
+                for pattern in (
+                    'values_%s.xml',
+                    'Arrays_%s.xml',
+                    'Qualifications_QT_%s.xml',
+                )
+            ]
+            cache_file = cache_path(self.__data_dir, 'values_%s' % name)
+            records = load_cached(cache_file, files, load)
+            with self.__cache_lock:
+                self.__cache.setdefault(name, records)
         return self.__cache[name]
 
+    def load_all(self, names=None):
+        """Load the records of several datatypes (all by default)."""
+        if names is None:
+            names = [t.name() for t in self.datatypes().values()]
+        for name in names:
+            self.load_rec(name)
+
+    def warmup(self):
+        """Load the dataset wide tables.
+
+        Texts keep loading in the background, text() only waits for the
+        files it needs. Tables that fail are reported and left to be loaded
+        again, and fail, when used.
+        """
+        def load_texts():
+            try:
+                self.texts()
+            except Exception as e:
+                print_error(str(e))
+
+        threading.Thread(target=load_texts, daemon=True).start()
+        loaders = (
+            self.datatypes,
+            self.qualifiers,
+            self.vehicles,
+            self.modules,
+            self.mnemonics,
+        )
+        for loader in loaders:
+            try:
+                loader()
+            except Exception as e:
+                print_error(str(e))
+
     def qualifiers(self):
         if self.__qualifiers is None:
-            self.__qualifiers = {}
-            data_dir = os.path.join(self.__context.root, 'Data')
-            vehicle_file = os.path.join(data_dir, 'vehicle.xml')
+            qualifiers = {}
+            vehicle_file = os.path.join(self.__data_dir, 'vehicle.xml')
             if not os.path.isfile(vehicle_file):
                 msg = "vehicle.xml file not found %s" % vehicle_file
                 raise ValueError(msg)
-            vehicle_1_file = os.path.join(data_dir, 'vehicle_1.xml')
+            vehicle_1_file = os.path.join(self.__data_dir, 'vehicle_1.xml')
             if not os.path.isfile(vehicle_1_file):
                 msg = "vehicle_1.xml file not found %s" % vehicle_1_file
                 raise ValueError(msg)
 
             with open_xml(vehicle_file) as file:
-                for event, elem in iterparse(file):
-                    if event == 'end' and elem.tag == 'm':
-                        qualifier = IDSQualifier.parse(elem)
-                        self.__qualifiers[qualifier.id()] = qualifier
+                context = iterparse(file, events=('end',), tag='m')
+                for event, elem in _fast_iter(context, ('m',)):
+                    qualifier = IDSQualifier.parse(elem)
+                    qualifiers[qualifier.id()] = qualifier
 
             with open_xml(vehicle_1_file) as file:
-                for event, elem in iterparse(file):
+                for event, elem in _fast_iter(iterparse(file), ('m',)):
                     if event == 'start' and elem.tag == 'm':
-                        qualifier = self.__qualifiers[elem.attrib['t']]
+                        qualifier = qualifiers[elem.attrib['t']]
                     elif event == 'end' and elem.tag == 'z':
                         key = elem.attrib['v']
                         qualifier.values()[key] = elem.attrib['m']
+            self.__qualifiers = qualifiers
 
         return self.__qualifiers
 
+    def _load_texts(self, text_file, texts):
+        """Read the texts of one file of XMLFiles/Text."""
+        lang = self.__context.lang.lower()
+        with open_xml(text_file) as file:
+            if USE_TARGET_PARSER:
+                parse_xml(file, _TextsTarget(lang, texts))
+                return
+            context = _fast_iter(iterparse(file), ('tm',))
+            for event, elem in context:
+                try:
+                    if event == 'start' and elem.tag == 'tm':
+                        name = elem.attrib['id']
+                    elif (
+                        event == 'end'
+                        and elem.tag == 'tu'
+                        and elem.nsmap['lang'] == lang
+                    ):
+                        texts[name] = elem.text
+                except KeyError:
+                    print_xml_error("Issue parsing", elem)
+
+    def _load_next_texts(self):
+        """Read one more text file, return False once all have been read.
+
+        A file is only dropped once read, one that fails raises again on the
+        next call. The first file defining a key wins, like in text().
+        """
+        with self.__texts_lock:
+            if self.__text_files is None:
+                texts_dir = os.path.join(self.__xmlfiles_dir, 'Text')
+                with os.scandir(texts_dir) as entries:
+                    self.__text_files = collections.deque(
+                        entry.path for entry in entries if entry.is_file()
+                    )
+            if not self.__text_files:
+                return False
+            texts = {}
+            self._load_texts(self.__text_files[0], texts)
+            for key, value in texts.items():
+                self.__text_cache.setdefault(key, value)
+            self.__text_files.popleft()
+            return True
+
+    def text(self, key):
+        """Return the text of a key, None if there is none.
+
+        Text files are only read until the first one holding the key.
+        """
+        while key not in self.__text_cache:
+            if not self._load_next_texts():
+                return None
+        return self.__text_cache[key]
+
     def texts(self):
         if self.__texts is None:
-            self.__texts = {}
-            lang = self.__context.lang.lower()
-            texts_dir = os.path.join(
-                os.path.join(self.__context.root, 'XMLFiles'),
-                'Text',
-            )
-            for x in os.listdir(texts_dir):
-                text_file = os.path.join(texts_dir, x)
-                if os.path.isfile(text_file):
-                    with open_xml(text_file) as file:
-                        for event, elem in iterparse(file):
-                            try:
-                                if event == 'start' and elem.tag == 'tm':
-                                    name = elem.attrib['id']
-                                elif (
-                                    event == 'end'
-                                    and elem.tag == 'tu'
-                                    and elem.nsmap['lang'] == lang
-                                ):
-                                    self.__texts[name] = elem.text
-                            except KeyError:
-                                print_xml_error("Issue parsing", elem)
+            while self._load_next_texts():
+                pass
+            self.__texts = self.__text_cache
         return self.__texts
 
     def vehicles(self):
         if self.__vehicles is None:
-            self.__vehicles = {}
-            vehicle_file = os.path.join(
-                os.path.join(self.__context.root, 'Data'),
-                'vehicle_2.xml',
-            )
+            vehicles = {}
+            vehicle_file = os.path.join(self.__data_dir, 'vehicle_2.xml')
             if not os.path.isfile(vehicle_file):
                 msg = "vehicle_2.xml file not found %s" % vehicle_file
                 raise ValueError(msg)
 
             with open_xml(vehicle_file) as file:
-                for event, elem in iterparse(file):
-                    if event == 'end' and elem.tag == 'm':
-                        vehicle = IDSVehicle.parse(elem)
-                        self.__vehicles[vehicle.id()] = vehicle
+                if USE_TARGET_PARSER:
+                    self.__vehicles = parse_xml(file, _VehiclesTarget())
+                    return self.__vehicles
+                context = iterparse(file, events=('end',), tag='m')
+                for event, elem in _fast_iter(context, ('m',)):
+                    vehicle = IDSVehicle.parse(elem)
+                    vehicles[vehicle.id()] = vehicle
+            self.__vehicles = vehicles
 
         return self.__vehicles
 
     def modules(self):
         if self.__modules is None:
-            self.__modules = {}
-            mcprw_file = os.path.join(
-                os.path.join(self.__context.root, 'Data'),
-                'MCPRW_XMLFile.xml',
-            )
+            modules = {}
+            mcprw_file = os.path.join(self.__data_dir, 'MCPRW_XMLFile.xml')
             if not os.path.isfile(mcprw_file):
                 msg = "MCPRW_XMLFile.xml file not found %s" % mcprw_file
                 raise ValueError(msg)
 
-            with open_xml(mcprw_file, encoding='utf-8-sig') as file:
-                for event, elem in iterparse(
+            with open_xml(mcprw_file) as file:
+                context = iterparse(
                     file,
                     encoding='utf-8',
                     wrapper=True,
                     recover=False,
-                ):
+                )
+                tags = ('{VehicleModuleCorrel_XmlFile/RDS}ModuleDataName',)
+                for event, elem in _fast_iter(context, tags):
                     if event == 'start':
                         if (
                             elem.tag
                             == '{VehicleModuleCorrel_XmlFile/RDS}ModuleDataName'
                         ):
                             module = IDSXMLModule.parse(elem)
-                            self.__modules[module.id()] = module
+                            modules[module.id()] = module
                         elif (
                             elem.tag == '{VehicleModuleCorrel_XmlFile/RDS}Vehicle'
                         ):
@@ -718,15 +1279,16 @@ class IDSContext(object):
                         ):
                             f = IDSXMLFile.parse(elem)
                             vehicle.files()[f.id()] = f
+            self.__modules = modules
 
         return self.__modules
 
     def mnemonics(self):
         if self.__mnemonics is None:
-            self.__mnemonics = {}
+            mnemonics = {}
 
             mnemonics_file = os.path.join(
-                os.path.join(self.__context.root, 'Data'),
+                self.__data_dir,
                 'Mnemonics_%s.xml' % self.__context.lang,
             )
             if not os.path.isfile(mnemonics_file):
@@ -737,9 +1299,13 @@ class IDSContext(object):
                 raise ValueError(msg)
 
             with open_xml(mnemonics_file) as file:
-                for event, elem in iterparse(file):
-                    if event == 'end' and elem.tag == 'd':
-                        self.__mnemonics[elem.attrib['m']] = Mnemonic.parse(elem)
+                if USE_TARGET_PARSER:
+                    self.__mnemonics = parse_xml(file, _MnemonicsTarget())
+                    return self.__mnemonics
+                context = iterparse(file, events=('end',), tag='d')
+                for event, elem in _fast_iter(context, ('d',)):
+                    mnemonics[elem.attrib['m']] = Mnemonic.parse(elem)
+            self.__mnemonics = mnemonics
 
         return self.__mnemonics
 
@@ -748,45 +1314,130 @@ class IDSContext(object):
     ## Utils
     #
 
+    def _references_index(self):
+        """Map each type to the datatype attributes pointing at it."""
+        if self.__references_index is None:
+            index = {}
+            for t in self.datatypes().values():
+                for key, attribute in t.attributes().items():
+                    index.setdefault(attribute.type(), []).append(
+                        (t, key, attribute)
+                    )
+            self.__references_index = index
+        return self.__references_index
+
+    def _values_index(self, t, key, attribute_type):
+        """Map each value of an attribute to the records holding it."""
+        index = self.__values_index.get((t.name(), key))
+        if index is None:
+            index = {}
+            for n in self.load_rec(t.name()).values():
+                if key not in n.attributes:
+                    continue
+                attribute = n.attributes[key]
+                if attribute_type.array():
+                    if not isinstance(attribute, list):
+                        attribute = [attribute]
+                    for value in set(attribute):
+                        index.setdefault(value, []).append(n)
+                elif not isinstance(attribute, list):
+                    index.setdefault(attribute, []).append(n)
+            self.__values_index[(t.name(), key)] = index
+        return index
+
+    def keys_index(self, name):
+        """Return keys_index() of the records of a datatype."""
+        index = self.__keys_index.get(name)
+        if index is None:
+            index = keys_index(self.load_rec(name))
+            self.__keys_index[name] = index
+        return index
+
+    def _qualifications_index(self):
+        """Map vehicle ids (their a part) to the records qualified by them."""
+        if self.__qualifications_index is None:
+            self.load_all()
+            index = {}
+            for t in self.datatypes().values():
+                for n in self.load_rec(t.name()).values():
+                    if isinstance(n, IDSObject):
+                        for x in n.qualifications:
+                            key = IDSKey(x)
+                            index.setdefault(key.a(), []).append((key, n))
+            self.__qualifications_index = index
+        return self.__qualifications_index
+
+    def _cached(self, cache, obj, lookup):
+        """Return lookup(obj), remembered in cache by object id.
+
+        Only the last LOOKUP_CACHE_SIZE objects are kept, along with their
+        result so that their id cannot be reused.
+        """
+        hit = cache.get(id(obj))
+        if hit is not None and hit[0] is obj:
+            cache.move_to_end(id(obj))
+            return hit[1]
+        ret = lookup(obj)
+        cache[id(obj)] = (obj, ret)
+        if len(cache) > LOOKUP_CACHE_SIZE:
+            cache.popitem(last=False)
+        return ret
+
     def get_references(self, obj):
-        types = [(t, key, t.attributes()[key]) for t in self.datatypes().values() for key in t.attributes() if
-                 t.attributes()[key].type() == obj.type()]
+        return self._cached(self.__references_cache, obj, self._references)
+
+    def _references(self, obj):
+        types = self._references_index().get(obj.type, ())
+        self.load_all([t.name() for (t, _, _) in types])
 
         ret = []
         for (t, key, attribute_type) in types:
-            for n in self.load_rec(t.name()).values():
-                if key in n.attributes():
-                    attribute = n.attributes()[key]
-                    if attribute_type.array():
-                        if obj.id().a() in attribute:
-                            ret.append(n)
-                    else:
-                        if obj.id().a() == attribute:
-                            ret.append(n)
+            index = self._values_index(t, key, attribute_type)
+            ret.extend(index.get(obj.id().a(), ()))
         if isinstance(obj, IDSVehicle):
-            for t in self.datatypes().values():
-                for n in self.load_rec(t.name()).values():
-                    if isinstance(n, IDSObject):
-                        for x in n.qualifications():
-                            if IDSKey(x) == obj.id():
-                                ret.append(n)
+            # Keys are only equal on a when one has no b, filter on that
+            qualified = self._qualifications_index().get(obj.id().a(), ())
+            ret.extend(n for (key, n) in qualified if key.matches(obj.id()))
         return ret
 
     def get_vehicles(self, obj):
-        return [self.vehicles()[IDSKey(x)] for x in obj.qualifications()]
+        return self._cached(self.__vehicles_cache, obj, self._vehicles)
+
+    def _vehicles(self, obj):
+        vehicles = self.vehicles()
+        return [vehicles[IDSKey(x)] for x in obj.qualifications]
 
     def get_parents(self, obj):
-        return [v for v in self.vehicles().values() if v.check(obj)]
+        return self._cached(self.__parents_cache, obj, self._parents)
+
+    def _parents(self, obj):
+        if self.__parents_index is None:
+            vehicles = list(self.vehicles().values())
+            index = QualifierIndex([v.qualifiers() for v in vehicles])
+            self.__parents_index = (vehicles, index)
+        (vehicles, index) = self.__parents_index
+        return [vehicles[p] for p in index.match(obj.qualifiers())]
 
     def get_modules(self, obj):
+        return self._cached(self.__modules_cache, obj, self._modules)
+
+    def _modules(self, obj):
+        if self.__modules_index is None:
+            # One column per field read when matching
+            names = []
+            files = []
+            qualifiers = []
+            for module in self.modules().values():
+                for v in module.vehicles():
+                    names.append(module.name())
+                    files.append(v.files())
+                    qualifiers.append(v.qualifiers())
+            index = QualifierIndex(qualifiers)
+            self.__modules_index = (names, files, index)
+        (names, files, index) = self.__modules_index
         modules = {}
-        for module in self.modules().values():
-            ret = []
-            for v in module.vehicles():
-                if v.check(obj):
-                    ret.append(v)
-            if len(ret) != 0:
-                modules[module.name()] = [x.files() for x in ret]
+        for p in index.match(obj.qualifiers()):
+            modules.setdefault(names[p], []).append(files[p])
         return modules
 
 
@@ -811,7 +1462,7 @@ def object_string(ctx, obj, attribute_type=None):
             obj = ctx.mnemonics()[obj]
 
     if isinstance(obj, IDSObject):
-        txt = "%s(%s)" % (str(obj), obj.type())
+        txt = "%s(%s)" % (str(obj), obj.type)
     elif isinstance(obj, IDSVehicle):
         txt = "%s" % (str(obj))
     elif isinstance(obj, dict):
@@ -831,8 +1482,8 @@ def print_rec(ctx, obj, tab=0, limit=-1, attribute_type=None):
         return
 
     if isinstance(obj, IDSObject):
-        obj_attributes = obj.attributes()
-        datatype = ctx.datatypes_by_name()[obj.type()]
+        obj_attributes = obj.attributes
+        datatype = ctx.datatypes_by_name()[obj.type]
         for key, attribute in datatype.attributes().items():
             if key in obj_attributes:
                 value = obj_attributes[key]
@@ -865,24 +1516,27 @@ def print_rec(ctx, obj, tab=0, limit=-1, attribute_type=None):
 
 def resolve(ctx, obj):
     if isinstance(obj, MenuEntry):
+        name = obj.attribute_type()
+        records = ctx.load_rec(name)
+        index = ctx.keys_index(name)
         if isinstance(obj.value(), list):
-            obj = [y for x in obj.value() for y in IDSKey(x).get_in(ctx.load_rec(obj.attribute_type()))]
+            obj = [
+                y
+                for x in obj.value()
+                for y in IDSKey(x).get_in(records, index)
+            ]
         else:
-            obj = IDSKey(obj.value()).get_in(ctx.load_rec(obj.attribute_type()))
+            obj = IDSKey(obj.value()).get_in(records, index)
     return obj
 
 
+DISPLAYED_TYPES = (IDSObject, IDSVehicle, IDSXMLFile, dict)
+
+
 def display(ctx, obj, previous=None, next=None):
-    if isinstance(obj, IDSObject):
-        print_rec(ctx, obj, 0, 1)
-        print('')
-    elif isinstance(obj, IDSVehicle):
-        print_rec(ctx, obj, 0, 1)
-        print('')
-    elif isinstance(obj, IDSXMLFile):
-        print_rec(ctx, obj, 0, 1)
-        print('')
-    elif isinstance(obj, dict):
+    # Every displayed type is printed the same way, lists are only listed
+    # by the menu
+    if isinstance(obj, DISPLAYED_TYPES):
         print_rec(ctx, obj, 0, 1)
         print('')
 
@@ -902,56 +1556,70 @@ class MenuEntry(object):
 
 def menu(ctx, obj, vehicles, references, parents, modules, previous=None, next=None):
     choices = {}
+    lines = []
 
     if isinstance(obj, list):
         for i, k in enumerate(obj):
-            print("%d: %s" % (i, object_string(ctx, k)))
+            lines.append("%d: %s" % (i, object_string(ctx, k)))
             choices[str(i)] = k
 
     if isinstance(obj, dict):
         for i, (k, v) in enumerate(obj.items()):
-            print("%d: %s" % (i, object_string(ctx, k)))
+            lines.append("%d: %s" % (i, object_string(ctx, k)))
             choices[str(i)] = v
 
     elif isinstance(obj, IDSObject):
-        obj_attributes = obj.attributes()
-        datatype = ctx.datatypes_by_name()[obj.type()]
+        obj_attributes = obj.attributes
+        datatype = ctx.datatypes_by_name()[obj.type]
         i = 0
         for key, attribute in datatype.attributes().items():
             if key in obj_attributes:
                 value = obj_attributes[key]
                 if is_ids_object(value, attribute.type()):
-                    print("%d: %s" % (i, attribute.name()))
+                    lines.append("%d: %s" % (i, attribute.name()))
                     choices[str(i)] = MenuEntry(attribute.type(), attribute.function(value))
                     i += 1
         if references:
-            print('r: References')
+            lines.append('r: References')
             choices['r'] = references
         if vehicles:
-            print('v: Vehicles')
+            lines.append('v: Vehicles')
             choices['v'] = vehicles
     elif isinstance(obj, IDSVehicle):
         if references:
-            print('r: References')
+            lines.append('r: References')
             choices['r'] = references
         if parents:
-            print('x: Parents')
+            lines.append('x: Parents')
             choices['x'] = parents
         if modules:
-            print('m: Modules')
+            lines.append('m: Modules')
             choices['m'] = modules
 
     if previous:
-        print('p: Previous')
+        lines.append('p: Previous')
         choices['p'] = previous
     if next:
-        print('n: Next')
+        lines.append('n: Next')
         choices['n'] = next
-    print('q: Exit')
+    lines.append('q: Exit')
     choices['q'] = None
+    # The whole menu in a single write
+    sys.stdout.write('\n'.join(lines) + '\n')
     return choices
 
 
+def _run_prefetch(jobs):
+    """Fill the (future, lookup, obj) jobs, skipping cancelled ones."""
+    for future, lookup, obj in jobs:
+        if not future.set_running_or_notify_cancel():
+            continue
+        try:
+            future.set_result(lookup(obj))
+        except BaseException as e:
+            future.set_exception(e)
+
+
 def browse(ctx, obj):
     PREVIOUS_KEY = "PREVIOUS"
     NEXT_KEY = "NEXT"
@@ -959,8 +1627,17 @@ def browse(ctx, obj):
     VEHICLES_KEY = "VEHICLES"
     PARENTS_KEY = "PARENTS"
     MODULES_KEY = "MODULES"
-    previous = []
-    next = []
+    # Cheap lookups over the tables loaded by warmup(), prepared in the
+    # background while the user reads. References may load every datatype,
+    # they are only computed when asked for.
+    prefetched = {
+        VEHICLES_KEY: ctx.get_vehicles,
+        PARENTS_KEY: ctx.get_parents,
+        MODULES_KEY: ctx.get_modules,
+    }
+    previous = collections.deque()
+    forward = collections.deque()
+    import concurrent.futures
     while obj is not None:
         # Interpret menu entry
         obj = resolve(ctx, obj)
@@ -970,32 +1647,42 @@ def browse(ctx, obj):
 
         # Print corresponding menu
         choices = menu(ctx, obj, VEHICLES_KEY, REFERENCES_KEY, PARENTS_KEY, MODULES_KEY, PREVIOUS_KEY if len(previous) > 0 else None,
-                       NEXT_KEY if len(next) > 0 else None)
+                       NEXT_KEY if len(forward) > 0 else None)
+
+        # A daemon thread, leaving (or Ctrl-C) never waits for a lookup
+        prefetch = {}
+        jobs = []
+        for key, value in choices.items():
+            for name, lookup in prefetched.items():
+                if value is name:
+                    prefetch[key] = concurrent.futures.Future()
+                    jobs.append((prefetch[key], lookup, obj))
+        if jobs:
+            threading.Thread(
+                target=_run_prefetch, args=(jobs,), daemon=True
+            ).start()
 
         # Interpret the choice
         str = input("Choice? ")
+        for key, future in prefetch.items():
+            if key != str:
+                future.cancel()
         if str in choices:
             old = obj
             obj = choices[str]
             if obj == PREVIOUS_KEY:
-                next.insert(0, old)
+                forward.appendleft(old)
                 obj = previous.pop()
             elif obj == NEXT_KEY:
                 previous.append(old)
-                obj = next.pop(0)
+                obj = forward.popleft()
             else:
-                if obj == REFERENCES_KEY:
+                if str in prefetch:
+                    obj = prefetch[str].result()
+                elif obj == REFERENCES_KEY:
                     obj = ctx.get_references(old)
-                elif obj == VEHICLES_KEY:
-                    obj = ctx.get_vehicles(old)
-                elif obj == PARENTS_KEY:
-                    obj = ctx.get_parents(old)
-                elif obj == MODULES_KEY:
-                    obj = ctx.get_modules(old)
                 previous.append(old)
-                next[:] = []
+                forward.clear()
         else:
             print("Invalid input")
         print('')
-
-
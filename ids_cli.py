@@ -1,23 +1,39 @@
 """Command line interface for Mazda IDS parser."""
 
-import argparse
 import sys
+import types
 from ids import IDSContext, IDSKey, browse
 
 
+def parse_args(argv):
+    """Parse "[--lang LANG] root", argparse is only loaded for anything else.
+
+    Help requests, unknown options and usage errors go through argparse.
+    """
+    args = argv[1:]
+    lang = "ENG"
+    if len(args) == 3 and args[0] == "--lang":
+        lang = args[1]
+        args = args[2:]
+    if len(args) == 1 and not args[0].startswith("-"):
+        return types.SimpleNamespace(lang=lang, root=args[0])
+
+    import argparse
+    parser = argparse.ArgumentParser(prog=argv[0], description="IDS")
+    parser.add_argument("--lang", action="store", default="ENG", help="Default language")
+    parser.add_argument("root")
+    return parser.parse_args(argv[1:])
+
+
 def main(argv=None):
     """Entry point for the IDS command line interface."""
     if argv is None:
         argv = sys.argv
-    parser = argparse.ArgumentParser(prog=argv[0], description="IDS")
-    parser.add_argument("--lang", action="store", default="ENG", help="Default language")
-    parser.add_argument("root")
-    args = parser.parse_args(argv[1:])
+    args = parse_args(argv)
 
     ctx = IDSContext(args)
 
-    ctx.mnemonics()
-    ctx.texts()
+    ctx.warmup()
 
     recs = ctx.load_rec("MCP_FILE_INFO_REC")
     obj = recs[IDSKey("PSR8-188K2-B", "PSR8-188K2-B")]
@@ -15,6 +15,7 @@ setup(
     author='Yann Diorcet',
     py_modules=['ids', 'ids_cli'],
     install_requires=[
+        'lxml',
         'termcolor',
         proxy,
     ],
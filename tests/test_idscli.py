@@ -0,0 +1,24 @@
+import contextlib
+import io
+import unittest
+
+from ids_cli import parse_args
+
+
+class TestParseArgs(unittest.TestCase):
+    def test_fast_path(self):
+        args = parse_args(['ids', 'root'])
+        self.assertEqual((args.lang, args.root), ('ENG', 'root'))
+        args = parse_args(['ids', '--lang', 'FRA', 'root'])
+        self.assertEqual((args.lang, args.root), ('FRA', 'root'))
+
+    def test_argparse_fallback(self):
+        args = parse_args(['ids', 'root', '--lang=FRA'])
+        self.assertEqual((args.lang, args.root), ('FRA', 'root'))
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                parse_args(['ids', '--bad', 'root'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,12 @@
+import collections
 import os
 import tempfile
+import threading
 import unittest
+from unittest import mock
 
-from ids import IDSContext
+import ids
+from ids import IDSContext, IDSKey, cache_path, load_cached
 
 
 class DummyArgs:
@@ -11,6 +15,21 @@ class DummyArgs:
         self.lang = lang
 
 
+VEHICLES_XML = b'''<?xml version="1.0" encoding="iso-8859-1"?>
+<r>
+<m n="V1" s="V1" CM_MODEL="M3"/>
+<m n="V2" s="S2" CM_MODEL="M6" CM_Project="BASE"/>
+</r>
+'''
+
+TEXTS_XML = b'''<?xml version="1.0" encoding="iso-8859-1"?>
+<tmx>
+<tm id="K1"><tu xmlns:lang="eng">Hello</tu><tu xmlns:lang="fra">Salut</tu></tm>
+<tm id="K3"><tu xmlns:lang="eng">Hello <b>world</b></tu></tm>
+</tmx>
+'''
+
+
 class TestIDSContext(unittest.TestCase):
     def test_missing_datatypes(self):
         with tempfile.TemporaryDirectory() as tmp:
@@ -20,6 +39,152 @@ class TestIDSContext(unittest.TestCase):
             with self.assertRaises(ValueError):
                 ctx.datatypes()
 
+    def test_warmup_reports_missing_tables(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, 'Data'))
+            os.makedirs(os.path.join(tmp, 'XMLFiles', 'Text'))
+            ctx = IDSContext(DummyArgs(tmp))
+            with mock.patch.object(ids, 'print_error') as print_error:
+                ctx.warmup()
+            self.assertTrue(print_error.called)
+            with self.assertRaises(ValueError):
+                ctx.datatypes()
+
+    def test_warmup_reports_missing_texts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, 'Data'))
+            ctx = IDSContext(DummyArgs(tmp))
+            texts_failed = threading.Event()
+            with mock.patch.object(
+                ids, 'print_error',
+                side_effect=lambda txt: 'Text' in txt and texts_failed.set(),
+            ), mock.patch.object(threading, 'excepthook') as excepthook:
+                ctx.warmup()
+                self.assertTrue(texts_failed.wait(5))
+            excepthook.assert_not_called()
+
+    def test_texts_failures_and_duplicates(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            text_dir = os.path.join(tmp, 'XMLFiles', 'Text')
+            os.makedirs(text_dir)
+            for name in ('a.xml', 'b.xml'):
+                with open(os.path.join(text_dir, name), 'wb') as f:
+                    f.write(TEXTS_XML.replace(b'Hello', name.encode()))
+            ctx = IDSContext(DummyArgs(tmp))
+            self.assertEqual(ctx.text('K1'), ctx.texts()['K1'])
+
+            # A file that fails to load is read again, not dropped
+            ctx = IDSContext(DummyArgs(tmp))
+            with mock.patch.object(ids, 'open_xml', side_effect=OSError):
+                for _ in range(2):
+                    with self.assertRaises(OSError):
+                        ctx.texts()
+                with self.assertRaises(OSError):
+                    ctx.text('K1')
+            self.assertEqual(sorted(ctx.texts()), ['K1', 'K3'])
+
+    def test_vehicles_parsers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = os.path.join(tmp, 'Data')
+            os.makedirs(data_dir)
+            with open(os.path.join(data_dir, 'vehicle_2.xml'), 'wb') as f:
+                f.write(VEHICLES_XML)
+            for use_target_parser in (True, False):
+                with mock.patch.object(
+                    ids, 'USE_TARGET_PARSER', use_target_parser
+                ):
+                    vehicles = IDSContext(DummyArgs(tmp)).vehicles()
+                self.assertEqual(
+                    list(vehicles), [IDSKey('V1'), IDSKey('V2', 'S2')]
+                )
+                vehicle = vehicles[IDSKey('V2', 'S2')]
+                self.assertEqual(
+                    vehicle.qualifiers(),
+                    {'CM_MODEL': 'M6', 'CM_Project': 'BASE'},
+                )
+
+    def test_text(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            texts_dir = os.path.join(tmp, 'XMLFiles', 'Text')
+            os.makedirs(texts_dir)
+            with open(os.path.join(texts_dir, 'a.xml'), 'wb') as f:
+                f.write(TEXTS_XML)
+            for use_target_parser in (True, False):
+                with mock.patch.object(
+                    ids, 'USE_TARGET_PARSER', use_target_parser
+                ):
+                    ctx = IDSContext(DummyArgs(tmp))
+                    self.assertEqual(ctx.text('K1'), 'Hello')
+                    self.assertEqual(ctx.text('K3'), 'Hello ')
+                    self.assertIsNone(ctx.text('K2'))
+                    self.assertEqual(
+                        ctx.texts(), {'K1': 'Hello', 'K3': 'Hello '}
+                    )
+
+    def test_lookup_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ctx = IDSContext(DummyArgs(tmp))
+            cache = collections.OrderedDict()
+            objs = [object() for _ in range(3)]
+            calls = []
+
+            def lookup(obj):
+                calls.append(obj)
+                return [obj]
+
+            with mock.patch.object(ids, 'LOOKUP_CACHE_SIZE', 2):
+                first = ctx._cached(cache, objs[0], lookup)
+                self.assertIs(ctx._cached(cache, objs[0], lookup), first)
+                ctx._cached(cache, objs[1], lookup)
+                ctx._cached(cache, objs[0], lookup)
+                ctx._cached(cache, objs[2], lookup)
+                self.assertEqual(len(cache), 2)
+                self.assertIs(ctx._cached(cache, objs[0], lookup), first)
+                ctx._cached(cache, objs[1], lookup)
+            self.assertEqual(calls, [objs[0], objs[1], objs[2], objs[1]])
+
+    def test_load_cached(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'values.xml')
+            cache_file = os.path.join(tmp, 'values.cache')
+            with open(source, 'wb') as f:
+                f.write(b'<r/>')
+            calls = []
+
+            def load():
+                calls.append(None)
+                return {IDSKey('x'): len(calls)}
+
+            with mock.patch.object(ids, 'USE_CACHE', True):
+                self.assertEqual(load_cached(cache_file, [source], load),
+                                 {IDSKey('x'): 1})
+                self.assertEqual(load_cached(cache_file, [source], load),
+                                 {IDSKey('x'): 1})
+                with open(source, 'wb') as f:
+                    f.write(b'<r></r>')
+                self.assertEqual(load_cached(cache_file, [source], load),
+                                 {IDSKey('x'): 2})
+                # A stale digest rejects the cache before its payload
+                with open(cache_file, 'r+b') as f:
+                    f.write(b'\0' * ids.CACHE_DIGEST_SIZE)
+                    f.write(b'not a pickle')
+                with mock.patch.object(ids, 'print_error') as print_error:
+                    self.assertEqual(
+                        load_cached(cache_file, [source], load),
+                        {IDSKey('x'): 3},
+                    )
+                print_error.assert_not_called()
+
+    def test_cache_path(self):
+        with mock.patch.object(ids, 'CACHE_DIR', '/cache'):
+            path = cache_path('/data/Data', 'values_REC')
+            self.assertTrue(path.startswith('/cache' + os.sep))
+            self.assertTrue(path.endswith('values_REC.cache'))
+            self.assertNotEqual(
+                os.path.dirname(path),
+                os.path.dirname(cache_path('/other/Data', 'values_REC')),
+            )
+
 
 if __name__ == '__main__':
     unittest.main()
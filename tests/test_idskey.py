@@ -0,0 +1,59 @@
+import pickle
+import unittest
+
+from ids import IDSKey, keys_index
+
+
+class TestIDSKey(unittest.TestCase):
+    def test_string_key(self):
+        key = IDSKey('[123][abc]')
+        self.assertEqual(key.a(), '123')
+        self.assertEqual(key.b(), 'abc')
+        self.assertIsNone(IDSKey('123', '123').b())
+
+    def test_string_key_split(self):
+        # The bracket split must agree with the STRING_KEY regex
+        for txt in ('[a][b]', '[a][b][c]', '[a][]', '[a][b]c', '[a]', 'a'):
+            key = IDSKey(txt)
+            match = IDSKey.STRING_KEY.match(txt)
+            (a, b) = match.group(1, 2) if match else (txt, None)
+            self.assertEqual(key.a(), a)
+            self.assertEqual(key.b(), b or None)
+
+    def test_exact_dict_keys(self):
+        dic = {IDSKey('x'): 1, IDSKey('x', 'y'): 2, IDSKey('x', 'z'): 3}
+        self.assertEqual(len(dic), 3)
+        self.assertNotEqual(IDSKey('x', 'y'), IDSKey('x'))
+        self.assertTrue(IDSKey('x', 'y').matches(IDSKey('x')))
+        self.assertFalse(IDSKey('x', 'y').matches(IDSKey('x', 'z')))
+        index = keys_index(dic)
+        for idx in (None, index):
+            self.assertEqual(IDSKey('x').get_in(dic, idx), [1, 2, 3])
+            self.assertEqual(IDSKey('x', 'y').get_in(dic, idx), [1, 2])
+
+    def test_tuple(self):
+        key = IDSKey('[x][y]')
+        self.assertEqual(tuple(key), ('x', 'y'))
+        self.assertEqual(hash(key), hash(('x', 'y')))
+        self.assertEqual(str(key), 'x|y')
+        self.assertEqual(str(IDSKey('x')), 'x')
+
+    def test_interned(self):
+        self.assertIs(IDSKey('x', 'y'), IDSKey('[x][y]'))
+        self.assertIs(IDSKey('x'), IDSKey('x', 'x'))
+        self.assertIsNot(IDSKey('x'), IDSKey('x', 'y'))
+
+    def test_pickle(self):
+        key = IDSKey('x', 'y')
+        self.assertIs(pickle.loads(pickle.dumps(key)), key)
+
+    def test_get_in(self):
+        dic = {IDSKey('x', 'y'): 1, IDSKey('z'): 2}
+        self.assertEqual(IDSKey('x').get_in(dic), [1])
+        self.assertEqual(IDSKey('[z][w]').get_in(dic), [2])
+        self.assertEqual(IDSKey('x', 'w').get_in(dic), [])
+        self.assertEqual(IDSKey('x').get_in(dic, keys_index(dic)), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 import xml.etree.ElementTree as ET
 
-from ids import IDSVehicle, IDSXMLVehicle, IDSKey
+from ids import IDSVehicle, IDSXMLVehicle, IDSKey, QualifierIndex
 
 
 class TestIDSVehicle(unittest.TestCase):
@@ -23,5 +23,24 @@ class TestIDSXMLVehicle(unittest.TestCase):
         self.assertEqual(vehicle.qualifiers()['CM_Project'], 'MZ')
 
 
+class TestQualifierIndex(unittest.TestCase):
+    def test_match_like_check(self):
+        vehicles = [
+            IDSVehicle('1', '1', {'CM_MODEL': 'M3', 'CM_Project': 'MZ'}),
+            IDSVehicle('2', '2', {'CM_MODEL': 'M3', 'CM_Project': 'BASE'}),
+            IDSVehicle('3', '3', {'CM_MODEL': 'M6'}),
+            IDSVehicle('4', '4', {}),
+        ]
+        index = QualifierIndex([v.qualifiers() for v in vehicles])
+        for other in vehicles:
+            expected = [i for i, v in enumerate(vehicles) if v.check(other)]
+            self.assertEqual(index.match(other.qualifiers()), expected)
+            # Equal qualifier sets hit the cached result
+            self.assertIs(
+                index.match(dict(other.qualifiers())),
+                index.match(other.qualifiers()),
+            )
+
+
 if __name__ == '__main__':
     unittest.main()